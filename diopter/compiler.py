@@ -53,11 +53,13 @@ from __future__ import annotations
 import argparse
 import os
 import re
+import struct
 import subprocess
 import tempfile
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, fields, replace
 from enum import Enum
+from functools import cache, cached_property
 from itertools import chain
 from pathlib import Path
 from shutil import which
@@ -547,6 +549,37 @@ def parse_compiler(compiler_exe: Path) -> tuple[CompilerProject, Revision] | Non
             compiler project (LLVM or GCC)  and the parsed version, None if
             the parsing failed
     """
+    exe = which(compiler_exe)
+    if exe is None:
+        return _parse_compiler_uncached(compiler_exe)
+    # the modification time is part of the key so that a compiler
+    # rebuilt in place is parsed again
+    return _parse_compiler_cached(Path(exe), os.stat(exe).st_mtime_ns)
+
+
+@cache
+def _parse_compiler_cached(
+    compiler_exe: Path, mtime_ns: int
+) -> tuple[CompilerProject, Revision] | None:
+    """Memoized `_parse_compiler_uncached`, keyed on the
+    executable's location and its modification time.
+
+    Args:
+        compiler_exe (Path): the resolved path to the compiler executable
+        mtime_ns (int): the executable's modification time, only part of the key
+
+    Returns:
+        (CompilerProject, Revision) | None :
+            compiler project (LLVM or GCC)  and the parsed version, None if
+            the parsing failed
+    """
+    return _parse_compiler_uncached(compiler_exe)
+
+
+def _parse_compiler_uncached(
+    compiler_exe: Path,
+) -> tuple[CompilerProject, Revision] | None:
+    """Runs `compiler_exe -v` and parses its output, see `parse_compiler`."""
     info = run_cmd(f"{str(compiler_exe)} -v".split())
     for line in info.stderr.splitlines():
         if "clang version" in line:
@@ -840,6 +873,99 @@ class CompilationOutput(ABC):
         return False
 
 
+_SHF_WRITE = 0x1
+_SHF_ALLOC = 0x2
+_SHF_EXECINSTR = 0x4
+
+
+@dataclass(frozen=True)
+class _ELFSection:
+    """An ELF section header (the fields diopter needs).
+
+    Attributes:
+        type (int): sh_type
+        flags (int): sh_flags, e.g., _SHF_ALLOC | _SHF_EXECINSTR
+        offset (int): where the section's contents start in the file
+        size (int): the size of the section
+    """
+
+    type: int
+    flags: int
+    offset: int
+    size: int
+
+
+def _elf_sections(path: Path) -> list[_ELFSection] | None:
+    """Reads the section headers of an ELF file.
+
+    Args:
+        path (Path):
+            the ELF file (object file or executable)
+
+    Returns:
+        list[_ELFSection] | None:
+            the sections in file order or None if `path` is not an ELF file
+    """
+    with open(str(path), "rb") as f:
+        ident = f.read(16)
+        if len(ident) < 16 or ident[:4] != b"\x7fELF" or ident[4] not in (1, 2):
+            return None
+        is_64 = ident[4] == 2
+        endianness = "<" if ident[5] == 1 else ">"
+        if is_64:
+            header = f.read(48)
+            (shoff,) = struct.unpack_from(endianness + "Q", header, 0x28 - 16)
+            shentsize, shnum = struct.unpack_from(endianness + "HH", header, 0x3A - 16)
+            section_fmt = endianness + "IIQQQQ"
+        else:
+            header = f.read(36)
+            (shoff,) = struct.unpack_from(endianness + "I", header, 0x20 - 16)
+            shentsize, shnum = struct.unpack_from(endianness + "HH", header, 0x2E - 16)
+            section_fmt = endianness + "IIIIII"
+        if shoff == 0:
+            return []
+
+        f.seek(shoff)
+        if shnum == 0:
+            # More than 0xff00 sections, the real count is in section 0's sh_size
+            shnum = struct.unpack_from(section_fmt, f.read(shentsize))[5]
+            f.seek(shoff)
+        section_headers = f.read(shnum * shentsize)
+
+    sections = []
+    for i in range(shnum):
+        _, type_, flags, _, offset, size = struct.unpack_from(
+            section_fmt, section_headers, i * shentsize
+        )
+        sections.append(_ELFSection(type_, flags, offset, size))
+    return sections
+
+
+def _elf_text_size(path: Path) -> int | None:
+    """Computes the text size of an ELF file directly from its section headers.
+
+    Matches the text column of `size` (Berkeley format): the sum of the sizes
+    of all allocated sections that are executable or read-only.
+
+    Args:
+        path (Path):
+            the ELF file (object file or executable)
+
+    Returns:
+        int | None:
+            the text size or None if `path` is not an ELF file
+    """
+    sections = _elf_sections(path)
+    if sections is None:
+        return None
+    return sum(
+        section.size
+        for section in sections
+        if section.flags & _SHF_ALLOC
+        and (section.flags & _SHF_EXECINSTR or not section.flags & _SHF_WRITE)
+    )
+
+
 class BinaryOutputMixin(ABC):
     """Mixin for binary compilation outputs adding utility methods."""
 
@@ -864,8 +990,7 @@ class BinaryOutputMixin(ABC):
                 The binary's contents.
         """
 
-        with open(str(self.filename), "rb") as f:
-            return f.read()
+        return Path(self.filename).read_bytes()
 
     def text_size(self) -> int:
         """Return the text section size of the binary.
@@ -874,10 +999,12 @@ class BinaryOutputMixin(ABC):
             int:
                 The binary's text section size.
         """
-        size_cmd_output = run_cmd(f"size {self.filename}").stdout
-        line = list(size_cmd_output.splitlines())[-1].strip()
-        s = line.split()[0]
-        return int(s)
+        if (size := _elf_text_size(self.filename)) is not None:
+            return size
+        size_cmd_output = run_cmd(f"size {self.filename}").stdout.rstrip()
+        # only the last line is needed: "text data bss dec hex filename"
+        line = size_cmd_output[size_cmd_output.rfind("\n") + 1 :]
+        return int(line.split(None, 1)[0])
 
 
 class ExeCompilationOutput(CompilationOutput, BinaryOutputMixin):
@@ -1109,6 +1236,23 @@ class AsyncCompilationResult(Generic[CompilationOutputType]):
             self.proc.kill()
 
 
+# Patterns used by CompilationSetting.preprocess_program to make
+# the preprocessed code compiler agnostic, compiled once
+MALLOC_ATTRIBUTE_WITH_ARGS_RE = re.compile(
+    r"__attribute__ \(\(__malloc__ \(.*, .*\)\)\)"
+)
+F128_BUILTIN_RE = re.compile(r"extern int [^;]*f128[^;]*;")
+FLOATN_TYPEDEF_RE = re.compile(r"typedef [^;]*_Float\d+x?;")
+FLOATN_REPLACEMENTS = {
+    "_Float32x": "double",
+    "_Float64x": "long double",
+    "_Float32": "float",
+    "_Float64": "double",
+}
+# the x variants come first so that they are not matched as _Float32/_Float64
+FLOATN_RE = re.compile(r"_Float(?:32x|64x|32|64)")
+
+
 @dataclass(frozen=True, kw_only=True)
 class CompilationSetting:
     """
@@ -1158,6 +1302,24 @@ class CompilationSetting:
 
         # XXX: can't check flags as the args and flags may be split
 
+    @cached_property
+    def setting_flags(self) -> tuple[str, ...]:
+        """The flags, include paths and macro definitions of this setting
+        as compiler arguments. Computed once, as the setting is immutable.
+
+        Returns:
+            tuple[str, ...]:
+                the arguments
+        """
+        return tuple(
+            chain(
+                self.flags,
+                (f"-I{path}" for path in self.include_paths),
+                (f"-isystem{path}" for path in self.system_include_paths),
+                (f"-D{macro}" for macro in self.macro_definitions),
+            )
+        )
+
     def get_compilation_cmd(
         self,
         program: tuple[Source, Path],
@@ -1191,10 +1353,7 @@ class CompilationSetting:
                     if include_language_flags
                     else ("",)
                 ),
-                self.flags,
-                (f"-I{path}" for path in self.include_paths),
-                (f"-isystem{path}" for path in self.system_include_paths),
-                (f"-D{macro}" for macro in self.macro_definitions),
+                self.setting_flags,
                 program[0].get_compilation_flags(),
                 (str(program[1]),),
             )
@@ -1212,6 +1371,8 @@ class CompilationSetting:
         output: CompilationOutputType,
         additional_flags: tuple[str, ...] = tuple(),
         timeout: int | None = None,
+        stdout: IO[bytes] | int | None = subprocess.PIPE,
+        stderr: IO[bytes] | int | None = subprocess.PIPE,
     ) -> CompilationResult[CompilationOutputType]:
         """Compile a program with this setting.
 
@@ -1224,6 +1385,11 @@ class CompilationSetting:
                 additional flags used for the compilation
             timeout (int | None):
                 timeout in seconds for the compilation command
+            stdout (IO[bytes] | int | None):
+                where the compiler's stdout goes, only output sent to
+                subprocess.PIPE ends up in the result or a CompileError
+            stderr (IO[bytes] | int | None):
+                where the compiler's stderr goes, like stdout
 
         Returns:
             CompilationResult[CompilationOutputType]:
@@ -1240,6 +1406,8 @@ class CompilationSetting:
                 cmd,
                 timeout=timeout,
                 additional_env={"TMPDIR": tempfile.gettempdir()},
+                stdout=stdout,
+                stderr=stderr,
             )
         except subprocess.CalledProcessError as e:
             raise CompileError.from_called_process_exception(" ".join(cmd), e)
@@ -1327,24 +1495,17 @@ class CompilationSetting:
 
         if make_compiler_agnostic:
             # remove malloc attributes with args, clang doesn't understand these
-            preprocessed_source = re.sub(
-                r"__attribute__ \(\(__malloc__ \(.*, .*\)\)\)", r"", preprocessed_source
+            preprocessed_source = MALLOC_ATTRIBUTE_WITH_ARGS_RE.sub(
+                "", preprocessed_source
             )
             # remove f128 builtins builtins, clang doesn't understand these
-            preprocessed_source = re.sub(
-                r"extern int [^;]*f128[^;]*;", r"", preprocessed_source
-            )
+            preprocessed_source = F128_BUILTIN_RE.sub("", preprocessed_source)
             # remove Float*** typedefs, gcc doesn't like these
-            preprocessed_source = re.sub(
-                r"typedef [^;]*_Float\d+x?;", r"", preprocessed_source
-            )
+            preprocessed_source = FLOATN_TYPEDEF_RE.sub("", preprocessed_source)
             # replace remaining FloatX types with the standard ones
-            preprocessed_source = re.sub(r"_Float32x", r"double", preprocessed_source)
-            preprocessed_source = re.sub(
-                r"_Float64x", r"long double", preprocessed_source
+            preprocessed_source = FLOATN_RE.sub(
+                lambda m: FLOATN_REPLACEMENTS[m[0]], preprocessed_source
             )
-            preprocessed_source = re.sub(r"_Float32", r"float", preprocessed_source)
-            preprocessed_source = re.sub(r"_Float64", r"double", preprocessed_source)
 
         return program.with_preprocessed_code(preprocessed_source)
 
@@ -1591,7 +1752,7 @@ def find_standard_include_paths(
         tuple[str,...]:
             the include paths
     """
-    tf = temporary_file(contents="", suffix=".c" if not cpp else ".cpp")
+    tf = temporary_file(suffix=".c" if not cpp else ".cpp")
     # run clang with verbose output on an empty temporary file
     cmd = [str(clang.exe), str(tf.name), "-c", "-o/dev/null", "-v"]
     result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
@@ -1736,6 +1897,10 @@ class ClangTool:
                     )
 
 
+# ccomp doesn't understand inline assembly
+ASM_STATEMENT_RE = re.compile(r"__asm__ [^\)]*\)")
+
+
 @dataclass(frozen=True, kw_only=True)
 class CComp:
     """A ccomp(compcert) instance.
@@ -1781,7 +1946,7 @@ class CComp:
         assert program.language == Language.C
 
         # ccomp doesn't like these
-        code = re.sub(r"__asm__ [^\)]*\)", r"", program.get_modified_code())
+        code = ASM_STATEMENT_RE.sub("", program.get_modified_code())
 
         tf = temporary_file(contents=code, suffix=".c")
         cmd = (
@@ -1876,11 +2041,12 @@ def parse_compilation_setting_from_string(
     sources: list[SourceFile | ObjectCompilationOutput] = []
     flags: list[str] = []
     for arg in rest:
-        if arg.lower().endswith(CPP_EXT):
+        arg_lower = arg.lower()
+        if arg_lower.endswith(CPP_EXT):
             sources.append(SourceFile(language=Language.CPP, filename=Path(arg)))
-        elif arg.lower().endswith(C_EXT):
+        elif arg_lower.endswith(C_EXT):
             sources.append(SourceFile(language=Language.C, filename=Path(arg)))
-        elif arg.lower().endswith(OBJ_EXT):
+        elif arg_lower.endswith(OBJ_EXT):
             sources.append(ObjectCompilationOutput(filename=Path(arg)))
         else:
             flags.append(arg)
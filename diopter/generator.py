@@ -65,6 +65,9 @@ class Generator(ABC):
                 how many cases to generate
             executor (Executor):
                 executor used for running the code generation jobs
+            chunksize (int):
+                how many jobs are sent to a worker at once (only relevant
+                for ProcessPoolExecutor)
         Returns:
             Iterator[SourceProgram]: the generated programs
         """
@@ -14,8 +14,10 @@ if not sanitizer.sanitize(program):
 
 from __future__ import annotations
 
+import re
 import subprocess
 from dataclasses import dataclass
+from functools import cache
 from pathlib import Path
 
 from diopter.compiler import (
@@ -73,6 +75,21 @@ def supports_gnu2x(compiler: CompilerExe) -> bool:
         return False
 
 
+@cache
+def warnings_regex(warnings: tuple[str, ...]) -> re.Pattern[str]:
+    """Returns a compiled regex that matches any of `warnings`.
+
+    Args:
+        warnings (tuple[str, ...]):
+            the warnings to match
+
+    Returns:
+        re.Pattern[str]:
+            the compiled regex
+    """
+    return re.compile("|".join(re.escape(warning) for warning in warnings))
+
+
 class Sanitizer:
     """A wrapper of various sanitization methods.
 
@@ -284,15 +301,17 @@ class Sanitizer:
                 if self.debug:
                     print(e)
                 return SanitizationResult(check_warnings_failed=True)
-            warnings: set[str] = set()
-            for line in result.stdout_stderr_output.splitlines():
-                for checked_warning in self.checked_warnings:
-                    if checked_warning in line:
-                        if self.debug:
-                            warnings.add(checked_warning)
-                        else:
-                            return SanitizationResult(check_warnings_failed=True)
-            if self.debug and warnings:
+            output = result.stdout_stderr_output
+            if not self.debug:
+                if warnings_regex(self.checked_warnings).search(output):
+                    return SanitizationResult(check_warnings_failed=True)
+                return SanitizationResult()
+            warnings = set(
+                checked_warning
+                for checked_warning in self.checked_warnings
+                if checked_warning in output
+            )
+            if warnings:
                 print("Warnings found:", "|".join(warnings))
                 return SanitizationResult(check_warnings_failed=True)
             return SanitizationResult()
@@ -18,8 +18,16 @@ def run_cmd(
     cmd: Union[str, list[str]],
     working_dir: Path | None = None,
     additional_env: dict[str, str] = {},
+    stdout: IO[bytes] | int | None = subprocess.PIPE,
+    stderr: IO[bytes] | int | None = subprocess.PIPE,
     **kwargs: Any,  # https://github.com/python/mypy/issues/8772
 ) -> CommandOutput:
+    """Runs cmd and waits for it to finish.
+
+    stdout and stderr are passed to subprocess.run, only output sent to
+    subprocess.PIPE (the default) is returned, e.g., subprocess.DEVNULL
+    discards it without reading it back.
+    """
     if working_dir is None:
         working_dir = Path(os.getcwd())
     env = os.environ.copy()
@@ -32,13 +40,14 @@ def run_cmd(
         cwd=str(working_dir),
         check=True,
         env=env,
-        capture_output=True,
+        stdout=stdout,
+        stderr=stderr,
         **kwargs,
     )
 
     return CommandOutput(
-        stdout=output.stdout.decode("utf-8").strip(),
-        stderr=output.stderr.decode("utf-8").strip(),
+        stdout=output.stdout.decode("utf-8").strip() if output.stdout else "",
+        stderr=output.stderr.decode("utf-8").strip() if output.stderr else "",
     )
 
 
@@ -5,8 +5,11 @@ In this example diopter is used to generate and reduce a csmith
 that results in larger text with -Os than -O3
 """
 
+from functools import lru_cache
+
 from diopter.compiler import (
     CompilationSetting,
+    CompileError,
     CompilerExe,
     ObjectCompilationOutput,
     OptLevel,
@@ -17,6 +20,10 @@ from diopter.reducer import Reducer, ReductionCallback
 from diopter.sanitizer import Sanitizer
 
 
+# SourceProgram and CompilationSetting are frozen (hashable) dataclasses, so
+# repeated size queries for the same program/setting pair (e.g., filtering a
+# program and then reporting its sizes) don't recompile it
+@lru_cache(maxsize=16)
 def get_size(program: SourceProgram, setting: CompilationSetting) -> int:
     return setting.compile_program(
         program, ObjectCompilationOutput(None)
@@ -43,9 +50,14 @@ class ReduceObjectSize(ReductionCallback):
         self.Os = Os
 
     def test(self, program: SourceProgram) -> bool:
-        if not self.san.sanitize(program):
+        # Most candidates are not interesting, comparing the sizes first is
+        # much cheaper than sanitizing (which compiles and runs the program)
+        try:
+            if not filter(program, self.O3, self.Os):
+                return False
+        except CompileError:
             return False
-        return filter(program, self.O3, self.Os)
+        return bool(self.san.sanitize(program))
 
 
 if __name__ == "__main__":
@@ -1,41 +1,80 @@
+import os
 from pathlib import Path
-from tempfile import TemporaryDirectory
 
-from diopter.bisector import BisectionCallback, bisect, rev_parse
+import pytest
+
+from diopter.bisector import BisectionCallback, bisect
 from diopter.repository import Commit, Repo, Revision
 from diopter.utils import run_cmd
 
 
 class TestBisectionCallback(BisectionCallback):
     def check_impl(self, commit: Commit, repo_dir: Path) -> bool | None:
-        filenames = list(f for f in repo_dir.iterdir() if f.name != ".git")
-        if len(filenames) == 4:
+        # Count the files, stopping as soon as the answer can't change
+        n_files = 0
+        with os.scandir(repo_dir) as entries:
+            for entry in entries:
+                if entry.name == ".git":
+                    continue
+                n_files += 1
+                if n_files > 4:
+                    break
+        if n_files == 4:
             # Trigger a bisect skip
             return None
-        return len(filenames) > 2
-
-
-def test_bisection() -> None:
-    with TemporaryDirectory() as tmpdir:
-        run_cmd(f"git -C {tmpdir} init")
-        commits = []
-        for f in ("a", "b", "c", "d", "e", "f"):
-            fpath = Path(tmpdir) / f
-            fpath.touch()
-            run_cmd(f"git -C {tmpdir} add {f}")
-            run_cmd(f"git -C {tmpdir} commit -m 'Add {f}'")
-            commits.append(rev_parse(Path(tmpdir), "HEAD"))
-
-        repo = Repo(Path(tmpdir), Revision("master"))
-        bad = commits[-1]
-        good = commits[0]
-        callback = TestBisectionCallback()
-        result = bisect(
-            repo,
-            good=good,
-            bad=bad,
-            callback=callback,
-            no_checkout=False,
+        return n_files > 2
+
+
+def fast_import_stream(filenames: tuple[str, ...]) -> bytes:
+    """A git fast-import stream adding one empty file per commit to master."""
+    stream = []
+    for i, f in enumerate(filenames):
+        message = f"Add {f}"
+        stream.append(
+            f"commit refs/heads/master\n"
+            f"committer Test <test@test> {i} +0000\n"
+            f"data {len(message)}\n{message}\n"
+            f"M 100644 inline {f}\n"
+            f"data 0\n\n"
         )
-        assert result is not None
-        assert result == commits[2]
+    return "".join(stream).encode("utf-8")
+
+
+@pytest.fixture(scope="module")
+def bisect_repo(tmp_path_factory: pytest.TempPathFactory) -> tuple[Path, list[Commit]]:
+    """A repo with one commit per added file, shared by the module's tests.
+
+    Bisection runs in a separate worktree, so the repo itself is not modified.
+    """
+    repo_dir = tmp_path_factory.mktemp("bisect_repo")
+    run_cmd(f"git -C {repo_dir} init --initial-branch=master")
+    # Create all commits with a single fast-import instead of
+    # a touch/add/commit/rev-parse round trip per file
+    run_cmd(
+        f"git -C {repo_dir} fast-import --quiet",
+        input=fast_import_stream(("a", "b", "c", "d", "e", "f")),
+    )
+    commits = [
+        Commit(c)
+        for c in run_cmd(
+            f"git -C {repo_dir} rev-list --reverse master"
+        ).stdout.splitlines()
+    ]
+    return repo_dir, commits
+
+
+def test_bisection(bisect_repo: tuple[Path, list[Commit]]) -> None:
+    repo_dir, commits = bisect_repo
+    repo = Repo(repo_dir, Revision("master"))
+    bad = commits[-1]
+    good = commits[0]
+    callback = TestBisectionCallback()
+    result = bisect(
+        repo,
+        good=good,
+        bad=bad,
+        callback=callback,
+        no_checkout=False,
+    )
+    assert result is not None
+    assert result == commits[2]
@@ -1,3 +1,6 @@
+import hashlib
+import re
+from functools import lru_cache
 from pathlib import Path
 
 import pytest
@@ -12,10 +15,35 @@ from diopter.compiler import (
 )
 
 
-def real_world_compiler_invocations() -> list[str]:
+@lru_cache(maxsize=1)
+def real_world_compiler_invocations() -> tuple[str, ...]:
     path = Path(__file__).parent / Path("compilation_command_parsing_inputs.txt")
     with open(path, "r") as f:
-        return f.readlines()
+        return tuple(line.rstrip("\n") for line in f if not line.isspace())
+
+
+def invocation_id(line: str) -> str:
+    """A short but readable test id for a compiler invocation: the start of
+    the command plus a digest of all of it, to keep the ids unique."""
+    digest = hashlib.blake2b(line.encode("utf-8"), digest_size=4).hexdigest()
+    return f"{line[:40]}-{digest}"
+
+
+# Source files and flags that the parser must not leave in CompilationSetting.flags
+SOURCE_SUFFIXES = (".cpp", ".c", ".cxx", ".cc")
+PARSED_FLAG_PREFIXES = ("-O", "-I", "-isystem")
+PARSED_FLAGS = frozenset(("-o", "-c", "-S"))
+
+# The only flag a C++ compilation command adds to the parsed line
+EXPECTED_CPP_DIFF = frozenset(("-xc++",))
+
+
+SPLIT_FLAG_ARGUMENT_RE = re.compile(r"(-o|-isystem|-I)")
+
+
+def canonicalize_whitespace(cmd: str) -> str:
+    # separate -o/-isystem/-I from their arguments in a single pass
+    return " ".join(SPLIT_FLAG_ARGUMENT_RE.sub(r"\1 ", cmd).split())
 
 
 @pytest.mark.parametrize(
@@ -26,8 +54,9 @@ def real_world_compiler_invocations() -> list[str]:
         "gcc -Os -c -o test.o test.c",
         "g++ -Os -DNDEBUG  -c -MD -MT Dem.cpp.o -MF Dem.cpp.o.d -o Dem.cpp.o",
         "g++ -Os -I/path1 -isystem/path2 -isystem/path3 -isystem /path4 -I /path5",
-    ]
-    + real_world_compiler_invocations(),
+        *real_world_compiler_invocations(),
+    ],
+    ids=invocation_id,
 )
 def test_parsing_compile_settings(line: str) -> None:
     csetting, sources, output = parse_compilation_setting_from_string(line)
@@ -36,21 +65,13 @@ def test_parsing_compile_settings(line: str) -> None:
     ), f"\nline {line}\n sources {[source.filename for source in sources]}"
     for i, flag in enumerate(csetting.flags):
         if flag.endswith(".o"):
-            assert csetting.flags[i - 1] in ["-MT", "-MQ"], (
+            assert csetting.flags[i - 1] in ("-MT", "-MQ"), (
                 csetting.flags[i - 1],
                 flag,
             )
-        assert not flag.endswith(".cpp"), flag
-        assert not flag.endswith(".c"), flag
-        assert not flag.endswith(".cxx"), flag
-        assert not flag.endswith(".cc"), flag
-        assert not flag.startswith("-O"), flag
-        assert not flag.startswith("-I"), flag
-        assert not flag.startswith("-isystem"), flag
-        assert flag != "-o"
-        assert flag != "-c"
-        assert flag != "-S"
-        assert flag != "-o"
+        assert not flag.endswith(SOURCE_SUFFIXES), flag
+        assert not flag.startswith(PARSED_FLAG_PREFIXES), flag
+        assert flag not in PARSED_FLAGS, flag
 
     for path in csetting.include_paths:
         assert not path.startswith("-I"), path
@@ -67,9 +88,11 @@ def test_parsing_compile_settings(line: str) -> None:
     else:
         new_sources = sources
 
+    # shared by the C and C++ commands below
+    program = (SourceProgram(code="", language=Language.CPP), new_sources[0].filename)
     cmd = " ".join(
         csetting.get_compilation_cmd(
-            (SourceProgram(code="", language=Language.CPP), new_sources[0].filename),
+            program,
             output,
             False,
         )
@@ -81,34 +104,24 @@ def test_parsing_compile_settings(line: str) -> None:
     assert sources == sources_2
     assert output == output_2
 
-    def canonicalize_whitespace(cmd: str) -> str:
-        return " ".join(
-            cmd.replace("-o", "-o ")
-            .replace("-I", "-I ")
-            .replace("-isystem", "-isystem ")
-            .split()
-        )
-
     line = canonicalize_whitespace(line)
     cmd = canonicalize_whitespace(cmd)
     if "-O0" in cmd and "-O0" not in line:
         line += " -O0"
 
-    assert set(line.split()) == set(cmd.split())
+    line_tokens = frozenset(line.split())
+    assert line_tokens == set(cmd.split())
     cmd_cpp = canonicalize_whitespace(
         " ".join(
             csetting.get_compilation_cmd(
-                (
-                    SourceProgram(code="", language=Language.CPP),
-                    new_sources[0].filename,
-                ),
+                program,
                 output,
                 True,
             )
             + [str(source.filename) for source in new_sources]
         ).replace("dummy_source", "")
     )
-    assert set(cmd_cpp.split()) - set(line.split()) == set((("-xc++",)))
+    assert set(cmd_cpp.split()) - line_tokens == EXPECTED_CPP_DIFF
 
 
 def test_multi_source_file_parsing() -> None:
@@ -1,9 +1,15 @@
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from shutil import which
+from typing import Callable
+
+import pytest
 
 from diopter.compiler import (
     ASMCompilationOutput,
     CompilationSetting,
+    CompileError,
     CompilerExe,
     CompilerProject,
     ExeCompilationOutput,
@@ -14,7 +20,16 @@ from diopter.compiler import (
     OptLevel,
     SourceProgram,
 )
-from diopter.utils import run_cmd, temporary_file
+from diopter.utils import run_cmd
+
+from .elf_helpers import same_alloc_sections
+
+
+@pytest.fixture(scope="module")
+def gcc_cs() -> CompilationSetting:
+    """The system gcc at -O2, shared by most tests in this module."""
+    compiler = CompilerExe(CompilerProject.GCC, Path("gcc"), "")
+    return CompilationSetting(compiler=compiler, opt_level=OptLevel.O2)
 
 
 def test_compiler_exe_from_path() -> None:
@@ -35,8 +50,12 @@ def test_get_asm_from_program() -> None:
     cs = CompilationSetting(compiler=compiler, opt_level=OptLevel.O2, flags=("-m32",))
     asm = cs.compile_program(program, ASMCompilationOutput()).output.read()
 
-    tf = temporary_file(contents=program.code, suffix=program.get_file_suffix())
-    result = run_cmd(f"gcc {tf.name} -mno-red-zone -o /dev/stdout -O2 -m32 -S")
+    # feed the code through stdin, no need for a temporary source file
+    result = run_cmd(
+        f"gcc {program.language.get_language_flag()} - "
+        "-mno-red-zone -o /dev/stdout -O2 -m32 -S",
+        input=program.code.encode("utf-8"),
+    )
     asm_manual = result.stdout
 
     def canonicalize(asm: str) -> str:
@@ -47,84 +66,98 @@ def test_get_asm_from_program() -> None:
     assert canonicalize(asm) == canonicalize(asm_manual)
 
 
-def strip_and_read_binary(path: Path) -> bytes:
-    run_cmd(f"strip {path}")
-    with open(str(path), "rb") as f:
-        return f.read()
-
-
-def test_compile_to_object() -> None:
-    input_code = "int foo(int a){ return a + 1; }"
-    program = SourceProgram(code=input_code, language=Language.C)
-    compiler = CompilerExe(CompilerProject.GCC, Path("gcc"), "")
-    cs = CompilationSetting(compiler=compiler, opt_level=OptLevel.O2)
-    res = cs.compile_program(
-        program,
-        ObjectCompilationOutput(),
-    )
-    res.output.strip_symbols()
-    object1 = res.output.read()
-
-    code_file = temporary_file(contents=program.code, suffix=program.get_file_suffix())
-    object_file2 = temporary_file(contents="", suffix=".o")
-    cmd = f"gcc {code_file.name} -o {object_file2.name} -O2 -c"
-    run_cmd(cmd)
-
-    object2 = strip_and_read_binary(Path(object_file2.name))
-
-    assert object1 == object2
-
-
-def test_compile_to_object_cpp() -> None:
-    input_code = """#include <iostream>
+@pytest.mark.parametrize(
+    "input_code,language,output_type,reference_flags",
+    [
+        (
+            "int foo(int a){ return a + 1; }",
+            Language.C,
+            ObjectCompilationOutput,
+            ("-O2", "-c"),
+        ),
+        (
+            """#include <iostream>
                     void foo(int a){ std::cout<< a; }
-                 """
-    program = SourceProgram(code=input_code, language=Language.CPP)
-    compiler = CompilerExe(CompilerProject.GCC, Path("gcc"), "")
-    cs = CompilationSetting(compiler=compiler, opt_level=OptLevel.O2)
-    res = cs.compile_program(
+                 """,
+            Language.CPP,
+            ObjectCompilationOutput,
+            ("-O2", "-c"),
+        ),
+        (
+            "int foo(int a){ return a + 1; } int main(){return foo(1);}",
+            Language.C,
+            ExeCompilationOutput,
+            ("-O2",),
+        ),
+    ],
+    ids=["object", "object_cpp", "exec"],
+)
+def test_compile(
+    input_code: str,
+    language: Language,
+    output_type: type[ObjectCompilationOutput] | type[ExeCompilationOutput],
+    reference_flags: tuple[str, ...],
+    gcc_cs: CompilationSetting,
+    reference_compile: Callable[[str, Language, tuple[str, ...]], Path],
+) -> None:
+    program = SourceProgram(code=input_code, language=language)
+    res = gcc_cs.compile_program(
         program,
-        ObjectCompilationOutput(),
+        output_type(),
     )
+    if output_type is ExeCompilationOutput:
+        assert which(res.output.filename)
 
-    res.output.strip_symbols()
-    object1 = res.output.read()
+    output_file2 = reference_compile(program.code, program.language, reference_flags)
+    if output_type is ExeCompilationOutput:
+        assert which(output_file2)
 
-    object_file2 = temporary_file(contents="", suffix=".o")
-    code_file = temporary_file(contents=program.code, suffix=program.get_file_suffix())
-    cmd = f"g++ {code_file.name} -o {object_file2.name} -O2 -c"
-    run_cmd(cmd)
+    assert same_alloc_sections(res.output.filename, output_file2)
 
-    object2 = strip_and_read_binary(Path(object_file2.name))
 
-    assert object1 == object2
+def test_text_size(gcc_cs: CompilationSetting) -> None:
+    input_code = """
+    static const char msg[] = "hello";
+    int g;
+    int foo(int a){ return a + g + msg[a]; }
+    int main(int argc, char* argv[]){ return foo(argc); }
+    """
+    program = SourceProgram(code=input_code, language=Language.C)
+    for output in (ObjectCompilationOutput(), ExeCompilationOutput()):
+        res = gcc_cs.compile_program(program, output)
+        size_output = run_cmd(f"size {res.output.filename}").stdout
+        assert res.output.text_size() == int(size_output.splitlines()[-1].split()[0])
 
 
-def test_compile_to_exec() -> None:
-    input_code = "int foo(int a){ return a + 1; } int main(){return foo(1);}"
-    program = SourceProgram(code=input_code, language=Language.C)
-    compiler = CompilerExe(CompilerProject.GCC, Path("gcc"), "")
-    cs = CompilationSetting(compiler=compiler, opt_level=OptLevel.O2)
-    res = cs.compile_program(
+def test_compile_discard_output(gcc_cs: CompilationSetting) -> None:
+    # warns with -Wall (unused variable)
+    program = SourceProgram(code="int foo(){ int x; return 0; }", language=Language.C)
+    res = gcc_cs.compile_program(program, ObjectCompilationOutput(), ("-Wall",))
+    assert "unused variable" in res.stdout_stderr_output
+
+    res = gcc_cs.compile_program(
         program,
-        ExeCompilationOutput(),
+        ObjectCompilationOutput(),
+        ("-Wall",),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
     )
-    assert which(res.output.filename)
-    res.output.strip_symbols()
-    exe1 = res.output.read()
+    assert res.output.filename.exists()
+    assert res.stdout_stderr_output.strip() == ""
 
-    exe_file2 = temporary_file(contents="", suffix=".exe")
-    code_file = temporary_file(contents=program.code, suffix=program.get_file_suffix())
-    cmd = f"gcc {code_file.name} -o {exe_file2.name} -O2 "
-    run_cmd(cmd)
+    # with only stdout discarded the diagnostics are still reported
+    with pytest.raises(CompileError, match="STDERR"):
+        gcc_cs.compile_program(
+            SourceProgram(code="void foo(){", language=Language.C),
+            ObjectCompilationOutput(Path("/dev/null")),
+            stdout=subprocess.DEVNULL,
+        )
 
-    assert which(exe_file2.name)
-    exe2 = strip_and_read_binary(Path(exe_file2.name))
 
-    assert exe1 == exe2
+REMOVE_WHITESPACE = str.maketrans("", "", " \t\n\r\f\v")
 
 
-def test_preprocess() -> None:
+def test_preprocess(gcc_cs: CompilationSetting) -> None:
     input_code = """
     #define MACRO1 4
     int foo(){
@@ -132,15 +165,11 @@ def test_preprocess() -> None:
     }
     """
     program = SourceProgram(code=input_code, language=Language.C)
-    compiler = CompilerExe(CompilerProject.GCC, Path("gcc"), "")
-    cs = CompilationSetting(compiler=compiler, opt_level=OptLevel.O2)
-    pp_code = cs.preprocess_program(program, False, ("-DMACRO2=33",)).code
-    assert "".join(pp_code.split()) == "".join(
-        "int foo(){ return 4 + 33; }".split()
-    ), pp_code
+    pp_code = gcc_cs.preprocess_program(program, False, ("-DMACRO2=33",)).code
+    assert pp_code.translate(REMOVE_WHITESPACE) == "intfoo(){return4+33;}", pp_code
 
 
-def test_exe_run() -> None:
+def test_exe_run(gcc_cs: CompilationSetting) -> None:
     input_code = """
     #include <stdio.h>
     void foo(int argc){
@@ -151,9 +180,7 @@ def test_exe_run() -> None:
     }
     """
     program = SourceProgram(code=input_code, language=Language.C)
-    compiler = CompilerExe(CompilerProject.GCC, Path("gcc"), "")
-    cs = CompilationSetting(compiler=compiler, opt_level=OptLevel.O2)
-    res = cs.compile_program(
+    res = gcc_cs.compile_program(
         program,
         ExeCompilationOutput(),
     )
@@ -165,42 +192,37 @@ def test_exe_run() -> None:
     assert output.stdout.strip() == "3"
 
 
-def test_async_compile() -> None:
+def test_async_compile(gcc_cs: CompilationSetting) -> None:
     input_code = "int foo(int a){ return a + 1; }"
     program = SourceProgram(code=input_code, language=Language.C)
-    compiler = CompilerExe(CompilerProject.GCC, Path("gcc"), "")
-    cs = CompilationSetting(compiler=compiler, opt_level=OptLevel.O2)
-    res1 = cs.compile_program(
+    res1 = gcc_cs.compile_program(
         program,
         ObjectCompilationOutput(),
     )
-    res1.output.strip_symbols()
-    object1 = res1.output.read()
 
-    res2 = cs.compile_program_async(
+    res2 = gcc_cs.compile_program_async(
         program,
         ObjectCompilationOutput(),
     ).result(8)
 
-    res2.output.strip_symbols()
-    object2 = res2.output.read()
+    assert same_alloc_sections(res1.output.filename, res2.output.filename)
 
-    assert object1 == object2
-
-    async_res3 = cs.compile_program_async(
+    async_res3 = gcc_cs.compile_program_async(
         program,
         ObjectCompilationOutput(),
     )
     # calling wait should not change the result
     async_res3.wait(8)
     res3 = async_res3.result(8)
-    res3.output.strip_symbols()
-    object3 = res3.output.read()
 
-    assert object2 == object3
+    assert same_alloc_sections(res2.output.filename, res3.output.filename)
 
 
-def test_link() -> None:
+def test_link(
+    gcc_cs: CompilationSetting,
+    reference_compile: Callable[[str, Language, tuple[str, ...]], Path],
+    tmp_path: Path,
+) -> None:
     input_code1 = "int foo(int a){ return a + 1; }"
     input_code2 = """
                   int foo(int);
@@ -213,55 +235,39 @@ def test_link() -> None:
     program1 = SourceProgram(code=input_code1, language=Language.C)
     program2 = SourceProgram(code=input_code2, language=Language.C)
     program3 = SourceProgram(code=input_code3, language=Language.C)
-    compiler = CompilerExe(CompilerProject.GCC, Path("gcc"), "")
-    cs = CompilationSetting(compiler=compiler, opt_level=OptLevel.O2)
-    res1 = cs.compile_program(
-        program1,
-        ObjectCompilationOutput(),
-    )
-    res2 = cs.compile_program(
-        program2,
-        ObjectCompilationOutput(),
-    )
-    res3 = cs.compile_program(
-        program3,
-        ObjectCompilationOutput(),
-    )
-    exe_res1 = cs.link_objects(
+    programs = (program1, program2, program3)
+    # The compilations are independent, run them all concurrently:
+    # diopter's through compile_program_async and the reference ones
+    # in a thread pool
+    async_results = [
+        gcc_cs.compile_program_async(program, ObjectCompilationOutput())
+        for program in programs
+    ]
+    with ThreadPoolExecutor(len(programs)) as executor:
+        object_file1, object_file2, object_file3 = executor.map(
+            lambda program: reference_compile(
+                program.code, program.language, ("-O2", "-c")
+            ),
+            programs,
+        )
+    res1, res2, res3 = (async_result.result() for async_result in async_results)
+
+    exe_res1 = gcc_cs.link_objects(
         (res1.output, res2.output, res3.output), ExeCompilationOutput()
     )
-    exe_res1.output.strip_symbols()
-    exe_res2 = cs.link_objects_async(
+    exe_res2 = gcc_cs.link_objects_async(
         (res1.output, res2.output, res3.output), ExeCompilationOutput()
     ).result()
-    exe_res2.output.strip_symbols()
 
-    code_file1 = temporary_file(
-        contents=program1.code, suffix=program1.get_file_suffix()
-    )
-    code_file2 = temporary_file(
-        contents=program2.code, suffix=program2.get_file_suffix()
-    )
-    code_file3 = temporary_file(
-        contents=program3.code, suffix=program3.get_file_suffix()
-    )
-    object_file1 = temporary_file(contents="", suffix=".o")
-    object_file2 = temporary_file(contents="", suffix=".o")
-    object_file3 = temporary_file(contents="", suffix=".o")
-    run_cmd(f"{compiler.exe} -c -O2 {code_file1.name} -o {object_file1.name}")
-    run_cmd(f"{compiler.exe} -c -O2 {code_file2.name} -o {object_file2.name}")
-    run_cmd(f"{compiler.exe} -c -O2 {code_file3.name} -o {object_file3.name}")
-
-    exe3_file = temporary_file(contents="", suffix=".exe")
+    exe3_file = tmp_path / "linked.exe"
     run_cmd(
-        f"{compiler.exe} -O2 {object_file1.name} {object_file2.name} "
-        f"{object_file3.name} -o {exe3_file.name}"
+        f"{gcc_cs.compiler.exe} -O2 {object_file1} {object_file2} "
+        f"{object_file3} -o {exe3_file}"
     )
 
-    assert which(exe3_file.name)
-    exe3 = strip_and_read_binary(Path(exe3_file.name))
-    assert exe3 == exe_res1.output.read()
-    assert exe3 == exe_res2.output.read()
+    assert which(exe3_file)
+    assert same_alloc_sections(exe3_file, exe_res1.output.filename)
+    assert same_alloc_sections(exe3_file, exe_res2.output.filename)
 
 
 def get_opt() -> Opt:
@@ -0,0 +1,140 @@
+import os
+import re
+import tempfile
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Iterator
+
+import pytest
+
+from diopter.compiler import CompilerExe, CompilerProject, Language, parse_compiler
+from diopter.sanitizer import Sanitizer
+from diopter.utils import run_cmd
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    parser.addoption(
+        "--failfast-per-matrix-cell",
+        action="store_true",
+        default=False,
+        help="skip the remaining optimization level combinations of a program "
+        "in the preprocessor tests once one of them fails",
+    )
+
+
+SHM = Path("/dev/shm")
+
+
+def shm_is_usable() -> bool:
+    # the tests run the executables they compile, so noexec mounts won't do
+    return (
+        SHM.is_dir()
+        and os.access(SHM, os.W_OK | os.X_OK)
+        and not os.statvfs(SHM).f_flag & os.ST_NOEXEC
+    )
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    # Put pytest's own temporary directories (tmp_path, tmp_path_factory) in
+    # memory too. Only the root is moved, pytest still creates a numbered
+    # directory per session (so concurrent sessions don't clean up each
+    # other's files) and keeps the last few; --basetemp still takes precedence.
+    if shm_is_usable():
+        os.environ.setdefault("PYTEST_DEBUG_TEMPROOT", str(SHM))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def in_memory_tempdir() -> Iterator[None]:
+    """Keep the temporary files created by the tests (sources, objects,
+    executables) in /dev/shm if it is available, i.e., in memory instead of
+    on a possibly slow disk. This also applies to the compilers' own
+    temporary files via TMPDIR.
+    """
+    if not shm_is_usable():
+        yield
+        return
+    with tempfile.TemporaryDirectory(
+        prefix="diopter_tests_", dir=SHM
+    ) as tmpdir, pytest.MonkeyPatch.context() as mp:
+        mp.setenv("TMPDIR", tmpdir)
+        mp.setattr(tempfile, "tempdir", tmpdir)
+        yield
+
+
+@pytest.fixture(scope="session")
+def reference_compile(
+    tmp_path_factory: pytest.TempPathFactory,
+) -> Callable[[str, Language, tuple[str, ...]], Path]:
+    """Compiles code directly with gcc/g++, i.e., without diopter, to produce
+    reference outputs for the tests. Each (code, language, flags)
+    combination is compiled only once per session, the returned files must
+    not be modified.
+    """
+    output_dir = tmp_path_factory.mktemp("reference")
+    outputs: dict[tuple[str, Language, tuple[str, ...]], Path] = {}
+
+    def compile_reference(
+        code: str, language: Language, flags: tuple[str, ...]
+    ) -> Path:
+        key = (code, language, flags)
+        if key in outputs:
+            return outputs[key]
+        # The source file name ends up in the binary's build id, use names
+        # shaped like diopter's temporary files so the outputs are comparable
+        fd, source_name = tempfile.mkstemp(suffix=language.to_suffix(), dir=output_dir)
+        with os.fdopen(fd, "w") as f:
+            f.write(code)
+        source = Path(source_name)
+        output = source.with_suffix(".out")
+        compiler = "g++" if language == Language.CPP else "gcc"
+        run_cmd([compiler, str(source), "-o", str(output), *flags])
+        outputs[key] = output
+        return output
+
+    return compile_reference
+
+
+CLANG_NAME_RE = re.compile(r"clang(?:-(\d+))?")
+
+
+@lru_cache(maxsize=1)
+def find_clang() -> CompilerExe | None:
+    """Finds clang with a single scan of PATH, preferring plain `clang`
+    over versioned `clang-N` executables, and the highest N among those."""
+    # name -> (is plain clang, version)
+    candidates: dict[str, tuple[bool, int]] = {}
+    for directory in os.environ.get("PATH", "").split(os.pathsep):
+        try:
+            with os.scandir(directory or ".") as entries:
+                for entry in entries:
+                    if entry.name in candidates:
+                        continue
+                    m = CLANG_NAME_RE.fullmatch(entry.name)
+                    if m and os.access(entry.path, os.X_OK):
+                        version = m.group(1)
+                        candidates[entry.name] = (
+                            version is None,
+                            int(version) if version else 0,
+                        )
+        except OSError:
+            continue
+
+    if not candidates:
+        return None
+    path = Path(max(candidates, key=candidates.__getitem__))
+    project_revision = parse_compiler(path)
+    assert project_revision
+    return CompilerExe(CompilerProject.LLVM, path, project_revision[1])
+
+
+@pytest.fixture(scope="session")
+def clang() -> CompilerExe:
+    clang = find_clang()
+    assert clang, "Could not find a clang executable"
+    return clang
+
+
+@pytest.fixture(scope="session")
+def sanitizer(clang: CompilerExe) -> Sanitizer:
+    """A sanitizer shared by all tests, constructing one probes the compilers."""
+    return Sanitizer(clang=clang, debug=True)
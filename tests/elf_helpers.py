@@ -0,0 +1,44 @@
+from pathlib import Path
+
+from diopter.compiler import _SHF_ALLOC, _elf_sections
+
+SHT_NOBITS = 0x8
+
+
+def alloc_section_contents(path: Path) -> list[bytes] | None:
+    """Reads the contents of the sections that are loaded at runtime
+    (code and data) of an ELF file, i.e., everything that `strip` keeps
+    besides the headers.
+
+    Args:
+        path (Path):
+            the ELF file (object file or executable)
+
+    Returns:
+        list[bytes] | None:
+            the sections' contents in file order, empty for SHT_NOBITS
+            sections (e.g., .bss), or None if `path` is not an ELF file
+    """
+    sections = _elf_sections(path)
+    if sections is None:
+        return None
+    contents = []
+    with open(str(path), "rb") as f:
+        for section in sections:
+            if not section.flags & _SHF_ALLOC:
+                continue
+            if section.type == SHT_NOBITS:
+                contents.append(b"")
+                continue
+            f.seek(section.offset)
+            contents.append(f.read(section.size))
+    return contents
+
+
+def same_alloc_sections(path1: Path | str, path2: Path | str) -> bool:
+    """Compares the loaded sections (code and data) of two binaries in-process,
+    symbol tables and other non-alloc sections are ignored so the binaries
+    don't need to be stripped first."""
+    sections1 = alloc_section_contents(Path(path1))
+    assert sections1 is not None, f"{path1} is not an ELF file"
+    return sections1 == alloc_section_contents(Path(path2))
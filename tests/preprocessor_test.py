@@ -1,4 +1,15 @@
+import hashlib
+import json
+import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import product
 from pathlib import Path
+from typing import Callable, ContextManager, Iterator
+
+import pytest
 
 from diopter.compiler import (
     CompilationSetting,
@@ -6,52 +17,211 @@ from diopter.compiler import (
     CompilerProject,
     ObjectCompilationOutput,
     OptLevel,
+    SourceProgram,
 )
 from diopter.generator import CSmithGenerator
-from diopter.sanitizer import Sanitizer
+from diopter.sanitizer import SanitizationResult, Sanitizer
+from diopter.utils import run_cmd
 
+OPTLEVELS = (OptLevel.O0, OptLevel.O1, OptLevel.O2, OptLevel.O3, OptLevel.Os)
+OPTLEVEL_PAIRS = tuple(product(OPTLEVELS, OPTLEVELS))
 
-def test_preprocessor_make_compiler_agnostic() -> None:
-    gcc = CompilerExe(CompilerProject.GCC, Path("gcc"), "")
-    clang = CompilerExe(CompilerProject.GCC, Path("clang"), "")
 
-    san = Sanitizer(debug=True)
-    gen = CSmithGenerator(san)
-    program = gen.generate_program()
+def session_shared_dir(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """A temporary directory shared by all pytest-xdist workers of a session
+    (the workers' base temporary directories are siblings)."""
+    basetemp = tmp_path_factory.getbasetemp()
+    return basetemp.parent if "PYTEST_XDIST_WORKER" in os.environ else basetemp
 
-    optlevels = [OptLevel.O0, OptLevel.O1, OptLevel.O2, OptLevel.O3, OptLevel.Os]
 
-    for optlevel_preprocess in optlevels:
-        for optlevel_test in optlevels:
-            gccOp = CompilationSetting(
-                compiler=gcc, opt_level=optlevel_preprocess, flags=("-march=native",)
-            )
-            clangOp = CompilationSetting(
-                compiler=clang, opt_level=optlevel_preprocess, flags=("-march=native",)
-            )
-            gccOt = CompilationSetting(
-                compiler=gcc, opt_level=optlevel_test, flags=("-march=native",)
-            )
-            clangOt = CompilationSetting(
-                compiler=clang, opt_level=optlevel_test, flags=("-march=native",)
-            )
+def load_or_generate_csmith_program(
+    config: pytest.Config, sanitizer: Sanitizer
+) -> SourceProgram:
+    generator = CSmithGenerator(sanitizer)
+    cache = getattr(config, "cache", None)
+    if cache is None:
+        return generator.generate_program()
+
+    csmith_version = run_cmd(f"{generator.csmith} --version").stdout
+    key_digest = hashlib.blake2b(
+        f"{csmith_version}\n{generator.include_path}".encode("utf-8"),
+        digest_size=8,
+    ).hexdigest()
+    key = f"diopter/csmith_program/{key_digest}"
+    if (cached := cache.get(key, None)) is not None:
+        program = SourceProgram.from_json_dict(cached)
+        assert isinstance(program, SourceProgram)
+        return program
+
+    program = generator.generate_program()
+    cache.set(key, program.to_json_dict())
+    return program
 
-            pp_with_gcc = gccOp.preprocess_program(program, make_compiler_agnostic=True)
-            gccOt.compile_program(
-                pp_with_gcc, ObjectCompilationOutput(Path("/dev/null"))
-            )
-            clangOt.compile_program(
-                pp_with_gcc, ObjectCompilationOutput(Path("/dev/null"))
-            )
-            san.sanitize(pp_with_gcc)
 
-            pp_with_clang = clangOp.preprocess_program(
-                program, make_compiler_agnostic=True
+@pytest.fixture(scope="module")
+def csmith_program(
+    request: pytest.FixtureRequest,
+    tmp_path_factory: pytest.TempPathFactory,
+    sanitizer: Sanitizer,
+) -> SourceProgram:
+    """A single csmith program shared by all optimization level combinations
+    and by all pytest-xdist workers of the session.
+
+    The first worker to get here takes a lock and generates the program, the
+    others wait for it. Generating and sanitizing a csmith program is slow, so
+    the program is also kept in pytest's cache (if enabled) and reused across
+    sessions, as long as the csmith version and include path do not change.
+    Note that a warm cache therefore pins the test to the same program on
+    every run, use --cache-clear to test a freshly generated one.
+    """
+    shared_dir = session_shared_dir(tmp_path_factory)
+    program_file = shared_dir / "csmith_program.json"
+    failed_file = shared_dir / "csmith_program.failed"
+    try:
+        os.close(
+            os.open(
+                shared_dir / "csmith_program.lock",
+                os.O_CREAT | os.O_EXCL | os.O_WRONLY,
             )
-            gccOt.compile_program(
-                pp_with_clang, ObjectCompilationOutput(Path("/dev/null"))
+        )
+    except FileExistsError:
+        # another worker is generating the program
+        while not program_file.exists():
+            if failed_file.exists():
+                pytest.fail("generating the csmith program failed in another worker")
+            time.sleep(0.1)
+        program = SourceProgram.from_json_dict(json.loads(program_file.read_text()))
+        assert isinstance(program, SourceProgram)
+        return program
+
+    try:
+        program = load_or_generate_csmith_program(request.config, sanitizer)
+    except BaseException:
+        failed_file.touch()
+        raise
+    # write and rename so waiting workers never read a partial file
+    tmp_file = program_file.with_suffix(".tmp")
+    tmp_file.write_text(json.dumps(program.to_json_dict()))
+    tmp_file.replace(program_file)
+    return program
+
+
+@pytest.fixture(scope="module")
+def preprocess(
+    csmith_program: SourceProgram,
+) -> Callable[[CompilationSetting], SourceProgram]:
+    """Preprocesses csmith_program with a setting, at most once per setting.
+
+    The preprocessed program only depends on the preprocessing setting, not on
+    the optimization level it is tested with, so it is shared between cases.
+    """
+    preprocessed: dict[CompilationSetting, SourceProgram] = {}
+
+    def preprocess_impl(setting: CompilationSetting) -> SourceProgram:
+        if setting not in preprocessed:
+            preprocessed[setting] = setting.preprocess_program(
+                csmith_program, make_compiler_agnostic=True
             )
-            clangOt.compile_program(
-                pp_with_clang, ObjectCompilationOutput(Path("/dev/null"))
+        return preprocessed[setting]
+
+    return preprocess_impl
+
+
+@pytest.fixture(scope="module")
+def sanitize(sanitizer: Sanitizer) -> Callable[[SourceProgram], SanitizationResult]:
+    """Sanitizes a program, at most once per distinct program.
+
+    The programs preprocessed at one optimization level are tested at all of
+    them, and gcc and clang may preprocess a program identically.
+    """
+    results: dict[SourceProgram, SanitizationResult] = {}
+
+    def sanitize_impl(program: SourceProgram) -> SanitizationResult:
+        if program not in results:
+            results[program] = sanitizer.sanitize(program)
+        return results[program]
+
+    return sanitize_impl
+
+
+@pytest.fixture(scope="module")
+def failfast(
+    request: pytest.FixtureRequest,
+    tmp_path_factory: pytest.TempPathFactory,
+) -> Callable[[], ContextManager[None]]:
+    """With --failfast-per-matrix-cell, once one optimization level
+    combination fails for csmith_program the remaining ones are skipped.
+
+    There is a single csmith program per session, the failure is recorded as
+    a marker file in the directory shared by all pytest-xdist workers.
+    """
+    enabled = request.config.getoption("--failfast-per-matrix-cell")
+    marker = session_shared_dir(tmp_path_factory) / "csmith_program.failed_cell"
+
+    @contextmanager
+    def failfast_impl() -> Iterator[None]:
+        if not enabled:
+            yield
+            return
+        if marker.exists():
+            pytest.skip("another optimization level combination failed already")
+        try:
+            yield
+        except Exception:
+            marker.touch()
+            raise
+
+    return failfast_impl
+
+
+@pytest.mark.parametrize(
+    "optlevel_preprocess,optlevel_test",
+    OPTLEVEL_PAIRS,
+    ids=lambda opt_level: opt_level.name,
+)
+def test_preprocessor_make_compiler_agnostic(
+    optlevel_preprocess: OptLevel,
+    optlevel_test: OptLevel,
+    clang: CompilerExe,
+    sanitize: Callable[[SourceProgram], SanitizationResult],
+    preprocess: Callable[[CompilationSetting], SourceProgram],
+    failfast: Callable[[], ContextManager[None]],
+) -> None:
+    with failfast():
+        gcc = CompilerExe(CompilerProject.GCC, Path("gcc"), "")
+
+        gccOp = CompilationSetting(
+            compiler=gcc, opt_level=optlevel_preprocess, flags=("-march=native",)
+        )
+        clangOp = CompilationSetting(
+            compiler=clang, opt_level=optlevel_preprocess, flags=("-march=native",)
+        )
+        gccOt = CompilationSetting(
+            compiler=gcc, opt_level=optlevel_test, flags=("-march=native",)
+        )
+        clangOt = CompilationSetting(
+            compiler=clang, opt_level=optlevel_test, flags=("-march=native",)
+        )
+
+        pp_with_gcc = preprocess(gccOp)
+        pp_with_clang = preprocess(clangOp)
+
+        # The four compilations are independent, run them concurrently unless
+        # pytest-xdist already runs a test per core
+        jobs = tuple(product((gccOt, clangOt), (pp_with_gcc, pp_with_clang)))
+        max_workers = 1 if "PYTEST_XDIST_WORKER" in os.environ else len(jobs)
+        with ThreadPoolExecutor(max_workers) as executor:
+            # consume the results to propagate compilation errors
+            list(
+                executor.map(
+                    lambda job: job[0].compile_program(
+                        job[1],
+                        ObjectCompilationOutput(Path("/dev/null")),
+                        stdout=subprocess.DEVNULL,
+                    ),
+                    jobs,
+                )
             )
-            san.sanitize(pp_with_clang)
+
+        sanitize(pp_with_gcc)
+        sanitize(pp_with_clang)
@@ -1,58 +1,65 @@
-from pathlib import Path
-from shutil import which
-
 import pytest
 
-from diopter.compiler import (
-    CompilerExe,
-    CompilerProject,
-    Language,
-    SourceProgram,
-    parse_compiler,
-)
-from diopter.sanitizer import Sanitizer
+from diopter.compiler import CompilerExe, Language, SourceProgram
+from diopter.sanitizer import Sanitizer, warnings_regex
 
 
-def find_clang() -> CompilerExe | None:
-    v = ["-10", "-11", "-12", "-13", "-14", "-15", "-16", ""]
-    v.reverse()
+@pytest.fixture(scope="module")
+def memory_sanitizer(clang: CompilerExe) -> Sanitizer:
+    return Sanitizer(
+        clang=clang,
+        use_ub_address_sanitizer=False,
+        use_memory_sanitizer=True,
+        debug=True,
+    )
 
-    for version in v:
-        path = Path("clang" + version)
-        project_revision = parse_compiler(path)
-        assert project_revision
-        if which(path):
-            return CompilerExe(CompilerProject.LLVM, path, project_revision[1])
 
-    return None
+@pytest.fixture(scope="module", params=(False, True), ids=("nodebug", "debug"))
+def warnings_sanitizer(request: pytest.FixtureRequest, clang: CompilerExe) -> Sanitizer:
+    """check_for_compiler_warnings has separate debug and non-debug paths."""
+    return Sanitizer(clang=clang, debug=request.param)
 
 
-def test_check_for_compiler_warnings() -> None:
+def test_check_for_compiler_warnings(warnings_sanitizer: Sanitizer) -> None:
     # TODO: Can I find a test case that only clang
     # catches and a test case that only gcc catches?
 
-    clang = find_clang()
-    assert clang, "Could not find a clang executable"
-    san = Sanitizer(clang=clang)
     p1 = SourceProgram(
         code="int main(){return 0;}",
         language=Language.C,
     )
 
-    assert san.check_for_compiler_warnings(p1)
+    assert warnings_sanitizer.check_for_compiler_warnings(p1)
 
     p2 = SourceProgram(
         code="void main(){}",
         language=Language.C,
     )
 
-    assert san.check_for_compiler_warnings(p2).check_warnings_failed
+    assert warnings_sanitizer.check_for_compiler_warnings(p2).check_warnings_failed
+
+    # compiles, but with a checked warning in the output
+    p3 = SourceProgram(
+        code="int foo(int a){ if (a) return 1; } int main(){ return foo(0); }",
+        language=Language.C,
+    )
+    assert warnings_sanitizer.check_for_compiler_warnings(p3).check_warnings_failed
 
     p2 = SourceProgram(
         code="v main(){}",
         language=Language.C,
     )
-    assert san.check_for_compiler_warnings(p2).check_warnings_failed
+    assert warnings_sanitizer.check_for_compiler_warnings(p2).check_warnings_failed
+
+
+def test_warnings_regex() -> None:
+    regex = warnings_regex(("control reaches end", "a+b (c)", "uninitialized"))
+    assert regex.search("foo.c:1:1: warning: control reaches end of non-void")
+    assert regex.search("warning: 'x' is used uninitialized [-Wuninitialized]")
+    # the warnings are matched literally
+    assert regex.search("a+b (c)")
+    assert not regex.search("aab c")
+    assert not regex.search("warning: unused variable 'x'")
 
 
 @pytest.mark.parametrize(
@@ -64,12 +71,9 @@ def test_check_for_compiler_warnings() -> None:
         "int *g;" "void foo(int x) { g = &x;}" "int main(){foo(0); return *g;}",
     ],
 )
-def test_ub_and_address_sanitizer(code: str) -> None:
-    clang = find_clang()
-    assert clang, "Could not find a clang executable"
-    san = Sanitizer(clang=clang, debug=True)
+def test_ub_and_address_sanitizer(code: str, sanitizer: Sanitizer) -> None:
     p = SourceProgram(code=code, language=Language.C)
-    assert san.check_for_sanitizer_errors(
+    assert sanitizer.check_for_sanitizer_errors(
         p, sanitizer_flag="undefined,address"
     ).sanitizer_failed
 
@@ -80,18 +84,8 @@ def test_ub_and_address_sanitizer(code: str) -> None:
         "int main(){ int a[1]; if (a[0]) return 1; return 0;}",
     ],
 )
-def test_memory_sanitizer(code: str) -> None:
-    clang = find_clang()
-    assert clang, "Could not find a clang executable"
-    san = Sanitizer(
-        clang=clang,
-        use_ub_address_sanitizer=False,
-        use_memory_sanitizer=True,
-        debug=True,
-    )
+def test_memory_sanitizer(code: str, memory_sanitizer: Sanitizer) -> None:
     p = SourceProgram(code=code, language=Language.C)
-    assert san.check_for_sanitizer_errors(p, sanitizer_flag="memory").sanitizer_failed
-
-
-if __name__ == "__main__":
-    test_check_for_compiler_warnings()
+    assert memory_sanitizer.check_for_sanitizer_errors(
+        p, sanitizer_flag="memory"
+    ).sanitizer_failed